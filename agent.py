@@ -1,44 +1,111 @@
 from __future__ import annotations
 
-import json
-import re
-import time
+import asyncio
+from collections import deque
 
-from openai import OpenAI
+import httpx
+import orjson
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
-from config import SYSTEM_PROMPT
+from config import HISTORY_WINDOW, SYSTEM_PROMPT
+
+
+_SNAPSHOT_MARKER = "Accessibility Tree:"
+
+
+def new_http_client() -> httpx.AsyncClient:
+    """HTTP/2 keep-alive pool for LLM calls, meant to be shared across agents."""
+    return DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
 
 
 class WebAgent:
     """LLM-powered agent that decides actions based on page snapshots."""
 
-    def __init__(self, endpoint: str, model: str, api_key: str = "no-key"):
-        self.client = OpenAI(base_url=endpoint, api_key=api_key)
+    def __init__(
+        self,
+        endpoint: str,
+        model: str,
+        api_key: str = "no-key",
+        http_client: httpx.AsyncClient | None = None,
+        system_prompt: str = SYSTEM_PROMPT,
+    ):
+        self.client = AsyncOpenAI(base_url=endpoint, api_key=api_key, http_client=http_client)
         self.model = model
-        self.history: list[dict] = []
+        self.system_prompt = system_prompt
+        # Only the most recent turns are re-sent; older steps live in action_log
+        self.history: deque[dict] = deque(maxlen=HISTORY_WINDOW)
+        self.action_log: list[str] = []
 
-    def chat(self, user_message: str) -> str:
+    async def chat(self, user_message: str) -> str:
         """Send a message to the LLM and get a response. Retries on 429."""
+        # Older snapshots are stale — keep only the latest one in the prompt
+        for msg in self.history:
+            if msg["role"] == "user" and _SNAPSHOT_MARKER in msg["content"]:
+                msg["content"] = msg["content"].split(_SNAPSHOT_MARKER, 1)[0].rstrip()
         self.history.append({"role": "user", "content": user_message})
 
         for attempt in range(4):
             try:
-                resp = self.client.chat.completions.create(
+                stream = await self.client.chat.completions.create(
                     model=self.model,
-                    messages=[{"role": "system", "content": SYSTEM_PROMPT}] + self.history,
+                    messages=self._messages(),
                     temperature=0.2,
+                    stream=True,
                 )
-                reply = resp.choices[0].message.content.strip()
+                reply = (await self._read_action(stream)).strip()
                 self.history.append({"role": "assistant", "content": reply})
                 return reply
             except Exception as e:
                 if "429" in str(e) and attempt < 3:
                     wait = (attempt + 1) * 5
                     print(f"  ⏳  Rate limited — retrying in {wait}s …")
-                    time.sleep(wait)
+                    await asyncio.sleep(wait)
                 else:
                     raise
 
+    def _messages(self) -> list[dict]:
+        """Build the request messages: system prompt, prior-action summary, recent turns."""
+        # Stable prefix first (cacheable), per-step content after it
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.action_log:
+            messages.append(
+                {"role": "system", "content": "Prior actions:\n" + "\n".join(self.action_log)}
+            )
+        recent = list(self.history)
+        # The window can cut a pair in half; don't open the conversation mid-reply
+        while recent and recent[0]["role"] == "assistant":
+            recent.pop(0)
+        return messages + recent
+
+    def record_action(self, step: int, action: dict, outcome: str, goal: int | None = None):
+        """Append a one-line summary of an executed action to the action log."""
+        target = action.get("target") or {}
+        desc = " ".join(f"'{v}'" for v in target.values())
+        label = f"step {step}" if goal is None else f"step {step} (goal {goal})"
+        self.action_log.append(f"{label}: {action.get('action')} {desc} -> {outcome}")
+
+    @staticmethod
+    async def _read_action(stream) -> str:
+        """Accumulate streamed tokens until the first JSON object is closed."""
+        buf = ""
+        scanner = _ObjectScanner()
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                buf += delta
+                end = scanner.feed(delta)
+                if end is not None:
+                    # Stop the model generating trailing text we don't need
+                    return buf[:len(buf) - len(delta) + end + 1]
+        finally:
+            await stream.close()
+        return buf
+
     def add_error(self, error_msg: str):
         """Feed an error back into history so the LLM can recover."""
         self.history.append(
@@ -49,14 +116,49 @@ class WebAgent:
     def parse_action(text: str) -> dict | None:
         """Extract the first JSON object from the LLM response."""
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
             pass
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if m:
+        start = text.find("{")
+        while start != -1:
+            end = _ObjectScanner().feed(text, start)
+            if end is None:
+                break
             try:
-                return json.loads(m.group())
-            except json.JSONDecodeError:
-                pass
+                return orjson.loads(text[start:end + 1])
+            except orjson.JSONDecodeError:
+                start = text.find("{", start + 1)
         return None
 
+
+class _ObjectScanner:
+    """Incremental brace matcher that finds where the first JSON object closes."""
+
+    __slots__ = ("depth", "in_string", "escaped")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str, start: int = 0) -> int | None:
+        """Scan `text` from `start`; return the index of the closing brace, or None if still open."""
+        for i in range(start, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                # Quotes before the first brace are prose, not JSON strings
+                self.in_string = self.depth > 0
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i
+        return None
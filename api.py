@@ -5,16 +5,65 @@ Deploy to Google Cloud Run as a containerized service.
 """
 from __future__ import annotations
 
+import asyncio
 import os
 import traceback
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException
+from playwright.async_api import Browser
 from pydantic import BaseModel, Field
 
-from config import DEFAULT_ENDPOINT, DEFAULT_MODEL, DEFAULT_API_KEY, DEFAULT_URL
-from gurney import run_agent
+from config import DEFAULT_ENDPOINT, DEFAULT_MODEL, DEFAULT_API_KEY, DEFAULT_URL, MAX_CONCURRENCY
+from agent import new_http_client
+from browser import launch_browser
+from gurney import run_agent, run_agent_batch
 
-app = FastAPI(title="Gurney", description="Web-browsing agent API")
+
+# ── Browser lifecycle ─────────────────────────────────────────────────────────
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Launch Chromium once per worker; each /run only opens a new context."""
+    app.state.pw, app.state.browser = await launch_browser(headless=True)
+    app.state.browser_lock = asyncio.Lock()
+    app.state.http_client = new_http_client()
+    app.state.browser_sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    app.state.slots_lock = asyncio.Lock()
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+        await app.state.browser.close()
+        await app.state.pw.stop()
+
+
+app = FastAPI(title="Gurney", description="Web-browsing agent API", lifespan=lifespan)
+
+
+async def _get_browser() -> Browser:
+    """Return the shared browser, relaunching it if Chromium crashed or was OOM-killed."""
+    async with app.state.browser_lock:
+        if not app.state.browser.is_connected():
+            print("  ⚠️  Chromium disconnected — relaunching")
+            app.state.browser = await app.state.pw.chromium.launch(headless=True)
+    return app.state.browser
+
+
+@asynccontextmanager
+async def _context_slots(n: int):
+    """Hold `n` of the worker's MAX_CONCURRENCY browser-context slots for a run."""
+    acquired = 0
+    try:
+        # Acquire all-or-nothing so two batches can't each hold half the slots
+        async with app.state.slots_lock:
+            while acquired < n:
+                await app.state.browser_sem.acquire()
+                acquired += 1
+        yield
+    finally:
+        for _ in range(acquired):
+            app.state.browser_sem.release()
 
 
 # ── Request / Response models ─────────────────────────────────────────────────
@@ -31,25 +80,45 @@ class RunResponse(BaseModel):
     error: str | None = None
 
 
+class RunBatchRequest(BaseModel):
+    prompts: list[str] = Field(..., min_length=1, max_length=8, description="Goals sharing one start URL")
+    url: str = Field(default=DEFAULT_URL, description="Starting URL")
+    max_steps: int = Field(default=20, ge=1, le=50, description="Max interaction steps")
+
+
+class RunBatchResponse(BaseModel):
+    results: list[RunResponse]
+
+
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 @app.get("/health")
 async def health():
+    # Report unhealthy when Chromium is gone and can't be relaunched,
+    # so Cloud Run recycles the instance
+    try:
+        await _get_browser()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Browser unavailable: {e}")
     return {"status": "ok"}
 
 
 @app.post("/run", response_model=RunResponse)
 async def run(req: RunRequest):
     try:
-        result = await run_agent(
-            prompt=req.prompt,
-            url=req.url,
-            endpoint=DEFAULT_ENDPOINT,
-            model=DEFAULT_MODEL,
-            api_key=DEFAULT_API_KEY,
-            max_steps=req.max_steps,
-            headless=True,
-        )
+        # Excess requests queue here instead of opening more browser contexts
+        async with _context_slots(1):
+            result = await run_agent(
+                prompt=req.prompt,
+                url=req.url,
+                endpoint=DEFAULT_ENDPOINT,
+                model=DEFAULT_MODEL,
+                api_key=DEFAULT_API_KEY,
+                max_steps=req.max_steps,
+                headless=True,
+                browser=await _get_browser(),
+                http_client=app.state.http_client,
+            )
 
         if result is None:
             return RunResponse(
@@ -63,3 +132,39 @@ async def run(req: RunRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/run_batch", response_model=RunBatchResponse)
+async def run_batch(req: RunBatchRequest):
+    # Each prompt opens its own context, so a batch can never exceed the worker's slots
+    if len(req.prompts) > MAX_CONCURRENCY:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {MAX_CONCURRENCY} prompts per batch on this server.",
+        )
+
+    try:
+        async with _context_slots(len(req.prompts)):
+            results = await run_agent_batch(
+                prompts=req.prompts,
+                url=req.url,
+                endpoint=DEFAULT_ENDPOINT,
+                model=DEFAULT_MODEL,
+                api_key=DEFAULT_API_KEY,
+                max_steps=req.max_steps,
+                headless=True,
+                browser=await _get_browser(),
+                http_client=app.state.http_client,
+            )
+
+        return RunBatchResponse(results=[
+            RunResponse(success=True, result=result) if result is not None
+            else RunResponse(
+                success=False,
+                error=f"Reached max steps ({req.max_steps}) without an answer.",
+            )
+            for result in results
+        ])
+
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,17 +1,41 @@
 from __future__ import annotations
 
-from datetime import datetime
+import re
+import time
 from pathlib import Path
+from weakref import WeakKeyDictionary
 
-from playwright.async_api import async_playwright, Page, Browser
+from playwright.async_api import async_playwright, Page, Browser, Route
 
-from config import ACTION_DELAY, MAX_SNAPSHOT_CHARS
+from config import ACTION_DELAY, BLOCK_RESOURCES, MAX_SNAPSHOT_CHARS
 
 
 async def launch_browser(headless: bool = True):
-    """Launch Chromium and return (playwright, browser, page)."""
+    """Launch Chromium and return (playwright, browser)."""
     pw = await async_playwright().start()
     browser = await pw.chromium.launch(headless=headless)
+    return pw, browser
+
+
+# Resource types the accessibility tree never needs
+_BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+
+async def _block_heavy_resources(route: Route):
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def new_page(browser: Browser, block_resources: bool = BLOCK_RESOURCES):
+    """
+    Open an isolated context on a running browser and return (context, page).
+
+    With `block_resources`, images, fonts, media and stylesheets are aborted so
+    pages reach networkidle sooner. Disable it for sites whose interactivity
+    depends on CSS.
+    """
     context = await browser.new_context(
         viewport={"width": 1280, "height": 900},
         ignore_https_errors=True,
@@ -21,13 +45,16 @@ async def launch_browser(headless: bool = True):
             "Chrome/120.0.0.0 Safari/537.36"
         ),
     )
+    if block_resources:
+        await context.route("**/*", _block_heavy_resources)
     page = await context.new_page()
-    return pw, browser, page
+    return context, page
 
 
 async def navigate(page: Page, url: str):
     """Navigate to a URL and wait for the page to fully render."""
     print(f"\n🌐  Navigating to {url} …")
+    mark_snapshot_dirty(page)
     await page.goto(url, wait_until="domcontentloaded", timeout=30_000)
 
     try:
@@ -35,47 +62,137 @@ async def navigate(page: Page, url: str):
     except Exception:
         print("  ⏳  Network idle timeout — continuing anyway")
 
-    # Wait for JS frameworks (Next.js, etc.) to finish hydrating
+    # Wait for JS frameworks (Next.js, etc.) to render something interactable
     try:
         await page.wait_for_function(
-            "() => document.readyState === 'complete' && "
-            "!document.querySelector('#__next[data-reactroot]') || "
-            "document.readyState === 'complete'",
-            timeout=10_000,
+            "() => !!document.querySelector("
+            "'button, a, input, [role=button], [role=textbox]')",
+            timeout=3_000,
         )
     except Exception:
         pass
 
-    await page.wait_for_timeout(3000)
+
+# ── Snapshot cache ───────────────────────────────────────────────────────────
+
+_snapshot_caches: WeakKeyDictionary[Page, dict] = WeakKeyDictionary()
+
+
+def _snapshot_cache(page: Page) -> dict:
+    """Return the snapshot cache for a page, creating it on first use."""
+    cache = _snapshot_caches.get(page)
+    if cache is None:
+        cache = {"url": None, "dirty": True, "text": None}
+        _snapshot_caches[page] = cache
+        # Navigations, reloads and back/forward all fire framenavigated
+        page.on("framenavigated", lambda _: mark_snapshot_dirty(page))
+    return cache
+
+
+def mark_snapshot_dirty(page: Page):
+    """Invalidate the cached snapshot so the next get_snapshot re-reads the page."""
+    _snapshot_cache(page)["dirty"] = True
+
+
+# ── Snapshot pruning ─────────────────────────────────────────────────────────
+
+# One aria_snapshot node: `- role "name" [attr=value]: inline text`
+_NODE_RE = re.compile(
+    r'^- (?P<role>[a-z]+)(?: "(?P<name>.*?)")?(?P<attrs>(?: \[[^\]]*\])*)(?P<colon>:)?(?P<value> .*)?$'
+)
+
+# Unnamed wrappers whose children are hoisted into the parent
+_COLLAPSIBLE_ROLES = {"generic", "group", "list", "listitem", "none", "presentation"}
+
+# Roles worth keeping even without a name, since the agent can still act on them
+_INTERACTIVE_ROLES = {
+    "button", "link", "textbox", "searchbox", "combobox", "checkbox", "radio",
+    "switch", "slider", "spinbutton", "menuitem", "tab", "option",
+}
+
+
+def _prune_snapshot(tree_text: str) -> str:
+    """
+    Shrink an aria_snapshot while keeping everything the agent can target or read.
+
+    Drops /url properties and unnamed non-interactive leaves (images, separators),
+    hoists the children of unnamed wrapper nodes, and truncates on a node
+    boundary at MAX_SNAPSHOT_CHARS.
+    """
+    lines: list[str] = []
+    size = 0
+    ancestors: list[tuple[int, bool]] = []  # (indent, dropped) of open nodes
+
+    for line in tree_text.splitlines():
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        while ancestors and ancestors[-1][0] >= indent:
+            ancestors.pop()
+        dedent = 2 * sum(dropped for _, dropped in ancestors)
+
+        m = _NODE_RE.match(stripped)
+        if stripped.startswith("- /url:"):
+            continue
+        if m and not m["name"] and not m["value"]:
+            role = m["role"]
+            if m["colon"] and role in _COLLAPSIBLE_ROLES:
+                ancestors.append((indent, True))
+                continue
+            if not m["colon"] and role not in _INTERACTIVE_ROLES:
+                continue
+        ancestors.append((indent, False))
+
+        out = " " * (indent - dedent) + stripped
+        size += len(out) + 1
+        if size > MAX_SNAPSHOT_CHARS:
+            lines.append("…[truncated]")
+            break
+        lines.append(out)
+
+    # Drop the trailing colon from nodes whose children were all pruned
+    for i, line in enumerate(lines):
+        if line.endswith(":"):
+            nxt = lines[i + 1] if i + 1 < len(lines) else ""
+            if len(nxt) - len(nxt.lstrip()) <= len(line) - len(line.lstrip()):
+                lines[i] = line[:-1]
+
+    return "\n".join(lines)
 
 
 async def get_snapshot(page: Page) -> str:
     """Get the accessibility tree snapshot for the current page."""
+    cache = _snapshot_cache(page)
+    if not cache["dirty"] and cache["url"] == page.url:
+        return cache["text"]
+
     try:
         tree_text = await page.locator("body").aria_snapshot()
     except Exception as e:
-        tree_text = f"[Error getting accessibility tree: {e}]"
-
-    if len(tree_text) > MAX_SNAPSHOT_CHARS:
-        tree_text = tree_text[:MAX_SNAPSHOT_CHARS] + "\n…[truncated]"
+        # Don't cache errors — retry on the next call
+        return f"[Error getting accessibility tree: {e}]"
 
+    tree_text = _prune_snapshot(tree_text)
+    cache.update(url=page.url, dirty=False, text=tree_text)
     return tree_text
 
 
 # ── Action execution ─────────────────────────────────────────────────────────
 
+# Targeting methods in priority order: (required keys, locator factory)
+_RESOLVERS = [
+    (("role", "name"), lambda p, t: p.get_by_role(t["role"], name=t["name"])),
+    (("text",), lambda p, t: p.get_by_text(t["text"], exact=False)),
+    (("label",), lambda p, t: p.get_by_label(t["label"])),
+    (("placeholder",), lambda p, t: p.get_by_placeholder(t["placeholder"])),
+]
+
+
 def _resolve_locator(page: Page, target: dict):
     """Turn a target dict into a Playwright locator."""
-    if "role" in target and "name" in target:
-        return page.get_by_role(target["role"], name=target["name"])
-    elif "text" in target:
-        return page.get_by_text(target["text"], exact=False)
-    elif "label" in target:
-        return page.get_by_label(target["label"])
-    elif "placeholder" in target:
-        return page.get_by_placeholder(target["placeholder"])
-    else:
-        raise ValueError(f"Cannot resolve target: {target}")
+    for keys, resolve in _RESOLVERS:
+        if all(k in target for k in keys):
+            return resolve(page, target)
+    raise ValueError(f"Cannot resolve target: {target}")
 
 
 async def execute_action(page: Page, action: dict) -> str | None:
@@ -88,6 +205,7 @@ async def execute_action(page: Page, action: dict) -> str | None:
     elif act == "click":
         target = action.get("target", {})
         locator = _resolve_locator(page, target)
+        mark_snapshot_dirty(page)
         await locator.first.click(timeout=5000)
 
     elif act == "fill":
@@ -95,6 +213,7 @@ async def execute_action(page: Page, action: dict) -> str | None:
         text = action.get("text", "")
         submit = action.get("submit", False)
         locator = _resolve_locator(page, target)
+        mark_snapshot_dirty(page)
         await locator.first.fill(text)
         if submit:
             await locator.first.press("Enter")
@@ -102,13 +221,46 @@ async def execute_action(page: Page, action: dict) -> str | None:
     else:
         print(f"  ⚠️  Unknown action: {act}")
 
-    # Wait for page to settle, then fixed delay between interactions
+    await _wait_for_settle(page)
+    return None
+
+
+# Resolves once the DOM has been quiet for `quiet` ms (or after `cap` ms)
+_QUIESCENCE_JS = """
+([quiet, cap]) => new Promise(resolve => {
+    const root = document.body || document.documentElement;
+    const done = () => { observer.disconnect(); clearTimeout(capTimer); resolve(); };
+    let timer = setTimeout(done, quiet);
+    const capTimer = setTimeout(done, cap);
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quiet);
+    });
+    observer.observe(root, {childList: true, subtree: true, attributes: true, characterData: true});
+})
+"""
+
+
+async def _wait_for_settle(page: Page):
+    """Wait for network, DOM mutations and aria-busy regions to settle after an action."""
     try:
         await page.wait_for_load_state("networkidle", timeout=5_000)
     except Exception:
         pass
-    await page.wait_for_timeout(ACTION_DELAY)
-    return None
+
+    # Evaluation fails if the action triggered a navigation — nothing left to wait for
+    try:
+        await page.evaluate(_QUIESCENCE_JS, [ACTION_DELAY, 2_000])
+    except Exception:
+        pass
+
+    try:
+        await page.wait_for_function(
+            "() => !document.querySelector('[aria-busy=true]')",
+            timeout=2_000,
+        )
+    except Exception:
+        pass
 
 
 # ── Screenshot ────────────────────────────────────────────────────────────────
@@ -116,12 +268,24 @@ async def execute_action(page: Page, action: dict) -> str | None:
 SCREENSHOTS_DIR = Path("screenshots")
 
 
-async def take_screenshot(page: Page, label: str = "exit") -> str:
+async def take_screenshot(
+    page: Page,
+    label: str = "exit",
+    full_page: bool = False,
+    fmt: str = "jpeg",
+    quality: int = 70,
+) -> str:
     """Save a screenshot of the current page. Returns the file path."""
     SCREENSHOTS_DIR.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = SCREENSHOTS_DIR / f"{label}_{timestamp}.png"
-    await page.screenshot(path=str(filename), full_page=True)
+    ext = "jpg" if fmt == "jpeg" else fmt
+    # Nanosecond stamp keeps concurrent runs from overwriting each other
+    filename = SCREENSHOTS_DIR / f"{label}_{time.time_ns():x}.{ext}"
+    await page.screenshot(
+        path=str(filename),
+        type=fmt,
+        quality=quality if fmt == "jpeg" else None,
+        full_page=full_page,
+    )
     print(f"  📸  Screenshot saved: {filename}")
     return str(filename)
 
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import logging
 import os
 import textwrap
+from typing import Final
 
 from dotenv import load_dotenv
 
@@ -17,14 +19,28 @@ DEFAULT_URL = "https://learnpf.ai"
 LEARNPF_USERNAME = os.getenv("LEARNPF_USERNAME")
 LEARNPF_PASSWORD = os.getenv("LEARNPF_PASSWORD")
 
+if not (LEARNPF_USERNAME and LEARNPF_PASSWORD):
+    logging.getLogger(__name__).warning(
+        "LEARNPF_USERNAME / LEARNPF_PASSWORD not set — credential placeholders won't be filled"
+    )
+
 # ── Constants ────────────────────────────────────────────────────────────────
 
 MAX_SNAPSHOT_CHARS = 48_000
-ACTION_DELAY = 3000  # ms between every interaction
+MAX_CONCURRENCY = int(os.getenv("GURNEY_MAX_CONCURRENCY", "4"))  # agent runs per API worker
+if MAX_CONCURRENCY < 1:
+    raise ValueError(f"GURNEY_MAX_CONCURRENCY must be at least 1, got {MAX_CONCURRENCY}")
+BLOCK_RESOURCES = os.getenv("GURNEY_BLOCK_RESOURCES", "1") != "0"  # skip images/fonts/CSS
+SAVE_SCREENSHOT = os.getenv("GURNEY_SAVE_SCREENSHOT") == "1"  # screenshot on exit
+HISTORY_WINDOW = 4  # most recent chat messages re-sent to the LLM
+ACTION_DELAY = 250  # ms of DOM quiet that counts as settled after an interaction
 
 # ── System prompt ────────────────────────────────────────────────────────────
+# Sent verbatim as the first message of every request. Keep it static (no
+# interpolation) so its bytes never change and providers with prefix caching
+# (Gemini's implicit cache, OpenAI's automatic cache) can reuse the prefill.
 
-SYSTEM_PROMPT = textwrap.dedent("""\
+SYSTEM_PROMPT: Final[str] = textwrap.dedent("""\
 You are a web-browsing agent. You are given:
 1. A user GOAL that you must accomplish.
 2. An accessibility tree snapshot of the current page. Each node has a "role" and "name".
@@ -64,3 +80,11 @@ General rules:
 - Keep "reason" short (one sentence).
 """)
 
+# Appended to SYSTEM_PROMPT when one LLM call drives several goals at once
+BATCH_SYSTEM_PROMPT: Final[str] = SYSTEM_PROMPT + textwrap.dedent("""
+Batch mode:
+- You are working on several numbered GOALs at once, each in its own browser tab.
+- Pages shared by several goals are listed once; each GOAL says which PAGE it is on.
+- Respond with a single JSON object {"actions": [...]} holding exactly one action
+  per GOAL, in the same order as the GOALs are listed.
+""")
@@ -10,14 +10,19 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import re
 import sys
 
+import httpx
+import uvloop
+from playwright.async_api import Browser
+
 from config import (
     DEFAULT_ENDPOINT, DEFAULT_MODEL, DEFAULT_API_KEY, DEFAULT_URL,
-    LEARNPF_USERNAME, LEARNPF_PASSWORD,
+    LEARNPF_USERNAME, LEARNPF_PASSWORD, SAVE_SCREENSHOT, BATCH_SYSTEM_PROMPT,
 )
 from agent import WebAgent
-from browser import launch_browser, navigate, get_snapshot, execute_action, take_screenshot
+from browser import launch_browser, new_page, navigate, get_snapshot, execute_action, take_screenshot
 
 
 # ── Credential injection ─────────────────────────────────────────────────────
@@ -27,6 +32,17 @@ PLACEHOLDERS = {
     "{{password}}": LEARNPF_PASSWORD,
 }
 
+_PLACEHOLDER_RE = re.compile("|".join(re.escape(p) for p in PLACEHOLDERS))
+
+
+def _substitute_placeholder(m: re.Match) -> str:
+    placeholder = m.group(0)
+    real_value = PLACEHOLDERS[placeholder]
+    if not real_value:
+        return placeholder
+    print(f"  🔑  Injecting real value for {placeholder}")
+    return real_value
+
 
 def inject_credentials(action: dict) -> dict:
     """Replace {{username}} / {{password}} placeholders with real values from .env."""
@@ -34,16 +50,26 @@ def inject_credentials(action: dict) -> dict:
         return action
 
     text = action.get("text", "")
-    for placeholder, real_value in PLACEHOLDERS.items():
-        if placeholder in text and real_value:
-            print(f"  🔑  Injecting real value for {placeholder}")
-            action["text"] = text.replace(placeholder, real_value)
+    if "{{" in text:
+        action["text"] = _PLACEHOLDER_RE.sub(_substitute_placeholder, text)
 
     return action
 
 
 # ── Main loop ────────────────────────────────────────────────────────────────
 
+async def _close_context(context, page, label: str):
+    """Close a run's context, taking the exit screenshot first if enabled."""
+    try:
+        if SAVE_SCREENSHOT:
+            await take_screenshot(page, label=label)
+    except Exception as e:
+        # A crashed or hung page must not keep its context open on the shared browser
+        print(f"  ⚠️  Exit screenshot failed: {e}")
+    finally:
+        await context.close()
+
+
 async def run_agent(
     prompt: str,
     url: str,
@@ -52,11 +78,25 @@ async def run_agent(
     api_key: str = "no-key",
     max_steps: int = 20,
     headless: bool = True,
+    browser: Browser | None = None,
+    http_client: httpx.AsyncClient | None = None,
 ):
-    agent = WebAgent(endpoint, model, api_key)
-    pw, browser, page = await launch_browser(headless=headless)
+    """
+    Run the agent loop and return its answer, or None if it ran out of steps.
+
+    Pass a running `browser` to reuse it (each run gets its own context);
+    otherwise a browser is launched for this run and closed afterwards.
+    Pass a shared `http_client` to reuse LLM connections across runs.
+    """
+    agent = WebAgent(endpoint, model, api_key, http_client=http_client)
+    pw = None
+    context = page = None
 
     try:
+        if browser is None:
+            pw, browser = await launch_browser(headless=headless)
+        context, page = await new_page(browser)
+
         await navigate(page, url)
 
         # ── Debug: print snapshot and exit (remove when agent loop is active)
@@ -81,7 +121,7 @@ async def run_agent(
             print(f"  Step {step}/{max_steps}")
             print(f"  URL: {page.url}")
         
-            raw = agent.chat(user_msg)
+            raw = await agent.chat(user_msg)
         
             action = agent.parse_action(raw)
             if action is None:
@@ -101,18 +141,130 @@ async def run_agent(
                     print(f"  ✅  AGENT ANSWER:\n\n{result}")
                     print(f"{'═'*60}\n")
                     return result
+                agent.record_action(step, action, "ok")
             except Exception as e:
                 err_msg = f"Action '{act}' failed: {e}"
                 print(f"  ❌  {err_msg}")
                 agent.add_error(err_msg)
+                agent.record_action(step, action, "failed")
         
         print(f"\n⚠️  Reached max steps ({max_steps}) without an answer.")
         return None
 
     finally:
-        await take_screenshot(page, label="exit")
-        await browser.close()
-        await pw.stop()
+        if context is not None:
+            await _close_context(context, page, label="exit")
+        if pw is not None:
+            await browser.close()
+            await pw.stop()
+
+
+async def run_agent_batch(
+    prompts: list[str],
+    url: str,
+    endpoint: str,
+    model: str,
+    api_key: str = "no-key",
+    max_steps: int = 20,
+    headless: bool = True,
+    browser: Browser | None = None,
+    http_client: httpx.AsyncClient | None = None,
+) -> list[str | None]:
+    """
+    Run several goals from the same starting URL with one LLM call per step.
+
+    Each goal gets its own context; pages with identical snapshots are sent
+    once, so the system prompt and shared trees are prefilled once per step
+    instead of once per goal. Returns one answer (or None) per prompt.
+    """
+    agent = WebAgent(
+        endpoint, model, api_key, http_client=http_client, system_prompt=BATCH_SYSTEM_PROMPT
+    )
+    pw = None
+    sessions: list = []  # (context, page) pairs, tracked as opened so all get closed
+    pages = []
+    results: list[str | None] = [None] * len(prompts)
+    active = list(range(len(prompts)))
+
+    async def run_step(step: int, i: int, action: dict):
+        act = action.get("action")
+        print(f"  Goal {i + 1} action: {act}  —  {action.get('reason', '')}")
+        action = inject_credentials(action)
+        try:
+            result = await execute_action(pages[i], action)
+            if result is not None:
+                print(f"  ✅  Goal {i + 1} answered")
+                results[i] = result
+                active.remove(i)
+                return
+            agent.record_action(step, action, "ok", goal=i + 1)
+        except Exception as e:
+            err_msg = f"Goal {i + 1}: action '{act}' failed: {e}"
+            print(f"  ❌  {err_msg}")
+            agent.add_error(err_msg)
+            agent.record_action(step, action, "failed", goal=i + 1)
+
+    try:
+        if browser is None:
+            pw, browser = await launch_browser(headless=headless)
+        for _ in prompts:
+            sessions.append(await new_page(browser))
+            pages.append(sessions[-1][1])
+
+        await asyncio.gather(*(navigate(page, url) for page in pages))
+
+        for step in range(1, max_steps + 1):
+            trees = await asyncio.gather(*(get_snapshot(pages[i]) for i in active))
+
+            # Goals still sitting on the same page share one copy of its tree
+            page_ids: dict[tuple[str, str], int] = {}
+            page_blocks: list[str] = []
+            goal_lines: list[str] = []
+            for i, tree_text in zip(active, trees):
+                key = (pages[i].url, tree_text)
+                if key not in page_ids:
+                    page_ids[key] = len(page_ids) + 1
+                    page_blocks.append(
+                        f"PAGE {page_ids[key]}\nCurrent URL: {key[0]}\n"
+                        f"Accessibility Tree:\n{tree_text}"
+                    )
+                goal_lines.append(f"GOAL {i + 1} (PAGE {page_ids[key]}): {prompts[i]}")
+
+            # Goals first so that stripping old trees from history keeps them
+            user_msg = "\n".join(goal_lines) + "\n\n" + "\n\n".join(page_blocks)
+
+            print(f"\n{'─'*60}")
+            print(f"  Step {step}/{max_steps}  ({len(active)} goals, {len(page_blocks)} pages)")
+
+            raw = await agent.chat(user_msg)
+
+            parsed = agent.parse_action(raw)
+            actions = parsed.get("actions") if isinstance(parsed, dict) else None
+            if (
+                not isinstance(actions, list)
+                or len(actions) != len(active)
+                or not all(isinstance(a, dict) for a in actions)
+            ):
+                print(f"  ⚠️  Could not parse batch actions:\n{raw[:300]}")
+                agent.add_error(f"Expected {{\"actions\": [...]}} with {len(active)} actions")
+                continue
+
+            await asyncio.gather(
+                *(run_step(step, i, action) for i, action in zip(list(active), actions))
+            )
+            if not active:
+                break
+        else:
+            print(f"\n⚠️  Reached max steps ({max_steps}) with {len(active)} goals unanswered.")
+
+        return results
+
+    finally:
+        for i, (context, page) in enumerate(sessions):
+            await _close_context(context, page, label=f"exit_goal{i + 1}")
+        if pw is not None:
+            await browser.close()
+            await pw.stop()
 
 
 # ── CLI ──────────────────────────────────────────────────────────────────────
@@ -139,7 +291,7 @@ def main():
 
     args = parser.parse_args()
 
-    result = asyncio.run(
+    result = uvloop.run(
         run_agent(
             prompt=args.prompt,
             url=args.url,
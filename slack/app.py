@@ -14,14 +14,15 @@ Required env vars (set in .env):
 """
 from __future__ import annotations
 
-import asyncio
 import logging
 import sys
 
+import uvloop
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
 
-from slack.config import SLACK_BOT_TOKEN, SLACK_APP_TOKEN, GURNEY_API_URL
+from slack.config import SLACK_BOT_TOKEN, SLACK_APP_TOKEN, GURNEY_DEBUG_EVENTS, CONFIG
+from slack.client import close_client
 from slack.handlers import register_handlers
 
 # ── Logging ───────────────────────────────────────────────────────────────────
@@ -52,14 +53,15 @@ def create_app() -> AsyncApp:
     """Build and configure the Bolt AsyncApp."""
     app = AsyncApp(token=SLACK_BOT_TOKEN)
     
-    # ── Debug: Log ALL incoming events ──────────────────────────────────────────
-    @app.middleware
-    async def log_all_events(body, next, logger):
-        """Log all incoming events for debugging."""
-        event_type = body.get("type") or body.get("event", {}).get("type", "unknown")
-        logger.info(f"[ 🔍 log_all_events ] Incoming event: type={event_type}")
-        logger.info(f"[ 🔍 log_all_events ] Full body: {body}")
-        await next()
+    # ── Debug: Log ALL incoming events (full body only at DEBUG) ────────────────
+    if GURNEY_DEBUG_EVENTS:
+        @app.middleware
+        async def log_all_events(body, next, logger):
+            """Log the type of every incoming event; the full body only at DEBUG level."""
+            event_type = body.get("type") or body.get("event", {}).get("type", "unknown")
+            logger.info("[ 🔍 log_all_events ] Incoming event: type=%s", event_type)
+            logger.debug("[ 🔍 log_all_events ] Full body: %s", body)
+            await next()
     
     register_handlers(app)
     logger.info("[ ✅ create_app ] App created and handlers registered")
@@ -72,13 +74,16 @@ async def main():
     _check_env()
 
     logger.info("🚀 Starting Gurney Slack bot (Socket Mode)")
-    logger.info(f"   Gurney API: {GURNEY_API_URL}")
+    logger.info(f"   Gurney API: {CONFIG.api_url}")
 
     app = create_app()
     handler = AsyncSocketModeHandler(app, SLACK_APP_TOKEN)
-    await handler.start_async()
+    try:
+        await handler.start_async()
+    finally:
+        await close_client()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    uvloop.run(main())
 
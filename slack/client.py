@@ -3,53 +3,182 @@ slack/client.py — Async HTTP client that calls the deployed Gurney API.
 """
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from hashlib import sha256
 
-import aiohttp
+import httpx
+import orjson
 
-from slack.config import GURNEY_API_URL, GURNEY_DEFAULT_URL, GURNEY_MAX_STEPS, GURNEY_API_TIMEOUT
+from slack.config import CONFIG
 
 logger = logging.getLogger(__name__)
 
 
-async def run_agent(prompt: str, url: str | None = None, max_steps: int | None = None) -> dict:
+@dataclass(frozen=True, slots=True)
+class AgentResult:
+    """Outcome of one Gurney /run call."""
+    success: bool
+    result: str | None = None
+    error: str | None = None
+
+
+_API_URL = f"{CONFIG.api_url}/run"
+_TIMEOUT = httpx.Timeout(CONFIG.api_timeout)
+
+# Shared across calls; HTTP/2 multiplexes concurrent calls over one warm connection
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=_TIMEOUT,
+            # Keep idle connections as long as a run can take so bursts find them warm
+            limits=httpx.Limits(
+                max_connections=20,
+                max_keepalive_connections=20,
+                keepalive_expiry=CONFIG.api_timeout,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the shared client (call on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ── Response cache ────────────────────────────────────────────────────────────
+# Successful results for identical (prompt, url, max_steps), LRU-evicted
+
+_CACHE_TTL = 600  # seconds
+_CACHE_MAX_SIZE = 512
+_RESPONSE_CACHE: OrderedDict[str, tuple[float, AgentResult]] = OrderedDict()
+
+
+def _cache_key(prompt: str, url: str, max_steps: int) -> str:
+    return sha256(f"{prompt}|{url}|{max_steps}".encode()).hexdigest()
+
+
+def _cache_get(key: str) -> AgentResult | None:
+    entry = _RESPONSE_CACHE.get(key)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    if time.monotonic() - stored_at > _CACHE_TTL:
+        del _RESPONSE_CACHE[key]
+        return None
+    _RESPONSE_CACHE.move_to_end(key)
+    return result
+
+
+def _cache_put(key: str, result: AgentResult):
+    _RESPONSE_CACHE[key] = (time.monotonic(), result)
+    _RESPONSE_CACHE.move_to_end(key)
+    while len(_RESPONSE_CACHE) > _CACHE_MAX_SIZE:
+        _RESPONSE_CACHE.popitem(last=False)
+
+
+# ── In-flight coalescing ──────────────────────────────────────────────────────
+# Concurrent identical calls share one upstream request, keyed like the cache
+
+_INFLIGHT: dict[str, asyncio.Task] = {}
+
+
+async def run_agent(
+    prompt: str, url: str | None = None, max_steps: int | None = None
+) -> AgentResult:
     """
-    Call the Gurney /run endpoint and return the JSON response.
+    Call the Gurney /run endpoint and return its outcome.
 
-    Returns dict with keys: success (bool), result (str|None), error (str|None)
-    Raises on network / HTTP errors.
+    HTTP error statuses come back as a failed AgentResult.
+    Raises on network errors.
     """
-    payload = {
-        "prompt": prompt,
-        "url": url or GURNEY_DEFAULT_URL,
-        "max_steps": max_steps or GURNEY_MAX_STEPS,
-    }
+    # Normalize once so the cache key always matches what is sent; "" and 0
+    # would be rejected by the API, so they fall back to the defaults too
+    final_url = url or CONFIG.default_url
+    final_steps = max_steps or CONFIG.max_steps
+    payload = {"prompt": prompt, "url": final_url, "max_steps": final_steps}
+
+    key = _cache_key(prompt, final_url, final_steps)
+    cached = _cache_get(key)
+    if cached is not None:
+        logger.info("[ 🌐 run_agent ] Cache hit for prompt=%r", prompt)
+        return cached
+
+    task = _INFLIGHT.get(key)
+    if task is not None:
+        logger.info("[ 🌐 run_agent ] Joining in-flight call for prompt=%r", prompt)
+    else:
+        task = asyncio.create_task(_call_api(payload, key))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
 
-    api_url = f"{GURNEY_API_URL}/run"
-    logger.info(f"[ 🌐 run_agent ] Calling API: {api_url}")
-    logger.info(f"[ 🌐 run_agent ] Payload: prompt={prompt!r}, url={payload['url']}, max_steps={payload['max_steps']}")
+    # Shielded so one caller giving up doesn't cancel the call for the others
+    return await asyncio.shield(task)
 
-    timeout = aiohttp.ClientTimeout(total=GURNEY_API_TIMEOUT)
+
+async def _call_api(payload: dict, key: str) -> AgentResult:
+    """POST the payload to /run, caching the result if it succeeded."""
+    client = _get_client()
+    t0 = time.monotonic()
 
     try:
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(api_url, json=payload) as resp:
-                logger.info(f"[ 🌐 run_agent ] API response status: {resp.status}")
-                if resp.status != 200:
-                    text = await resp.text()
-                    logger.error(f"[ 🌐 run_agent ] API error: {resp.status} - {text[:500]}")
-                    return {
-                        "success": False,
-                        "result": None,
-                        "error": f"API returned {resp.status}: {text[:500]}",
-                    }
-                result = await resp.json()
-                logger.info(f"[ 🌐 run_agent ] API success: {result.get('success', False)}")
-                return result
-    except aiohttp.ClientError as e:
-        logger.error(f"[ 🌐 run_agent ] Connection error: {e}")
+        async with client.stream(
+            "POST",
+            _API_URL,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+        ) as resp:
+            if resp.status_code != 200:
+                # Error bodies can be large HTML pages — only read what we keep
+                head = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    head += chunk
+                    if len(head) >= 500:
+                        break
+                snippet = head[:500].decode("utf-8", errors="replace")
+                logger.error("[ 🌐 _call_api ] API error: %s - %s", resp.status_code, snippet)
+                return AgentResult(False, None, f"API returned {resp.status_code}: {snippet}")
+
+            buf = bytearray()
+            async for chunk in resp.aiter_bytes(65536):
+                buf += chunk
+        data = orjson.loads(buf)
+        result = AgentResult(
+            success=bool(data.get("success")),
+            result=data.get("result"),
+            error=data.get("error"),
+        )
+        ms = (time.monotonic() - t0) * 1000
+        # One record per call; the extras stay machine-readable for log backends
+        logger.info(
+            "[ 🌐 _call_api ] gurney_call status=%s success=%s ms=%.0f url=%s",
+            resp.status_code, result.success, ms, payload["url"],
+            extra={
+                "api_url": _API_URL,
+                "status": resp.status_code,
+                "success": result.success,
+                "ms": ms,
+                "prompt_len": len(payload["prompt"]),
+            },
+        )
+        if result.success:
+            _cache_put(key, result)
+        return result
+    except httpx.HTTPError as e:
+        logger.error("[ 🌐 _call_api ] Connection error: %s", e)
         raise
     except Exception as e:
-        logger.error(f"[ 🌐 run_agent ] Unexpected error: {e}")
+        logger.error("[ 🌐 _call_api ] Unexpected error: %s", e)
         raise
-
@@ -4,6 +4,7 @@ slack/config.py — Environment variables and constants for the Slack bot.
 from __future__ import annotations
 
 import os
+from dataclasses import dataclass
 
 from dotenv import load_dotenv
 
@@ -17,15 +18,56 @@ SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN", "")
 SLACK_APP_TOKEN = os.environ.get("SLACK_APP_TOKEN", "")
 
 # ── Gurney API ────────────────────────────────────────────────────────────────
-# Base URL of the deployed Gurney Cloud Run service (no trailing slash)
-GURNEY_API_URL = os.environ.get("GURNEY_API_URL", "http://localhost:8080")
 
-# Default starting URL for the agent
-GURNEY_DEFAULT_URL = os.environ.get("GURNEY_DEFAULT_URL", "https://learnpf.ai")
+@dataclass(frozen=True, slots=True)
+class GurneyConfig:
+    # Base URL of the deployed Gurney Cloud Run service (no trailing slash)
+    api_url: str
+    # Default starting URL for the agent
+    default_url: str
+    # Max steps the agent can take per run (the API accepts 1–50)
+    max_steps: int
+    # Timeout in seconds for waiting on the Gurney API (agent runs can be slow)
+    api_timeout: int
+    # Agent runs each Slack user may start per minute (also the burst size)
+    rate_limit_rpm: int
+    # Requests that would wait longer than this (seconds) are rejected, not queued
+    rate_limit_max_wait: int
 
-# Max steps the agent can take per run
-GURNEY_MAX_STEPS = int(os.environ.get("GURNEY_MAX_STEPS", "20"))
 
-# Timeout in seconds for waiting on the Gurney API (agent runs can be slow)
-GURNEY_API_TIMEOUT = int(os.environ.get("GURNEY_API_TIMEOUT", "300"))
+def _load_gurney_config() -> GurneyConfig:
+    """Read and validate the Gurney API settings; raises ValueError on bad env."""
+    try:
+        max_steps = int(os.environ.get("GURNEY_MAX_STEPS", "20"))
+        api_timeout = int(os.environ.get("GURNEY_API_TIMEOUT", "300"))
+        rate_limit_rpm = int(os.environ.get("GURNEY_RATE_LIMIT_RPM", "5"))
+        rate_limit_max_wait = int(os.environ.get("GURNEY_RATE_LIMIT_MAX_WAIT", "10"))
+    except ValueError as e:
+        raise ValueError(
+            "GURNEY_MAX_STEPS / GURNEY_API_TIMEOUT / GURNEY_RATE_LIMIT_RPM / "
+            f"GURNEY_RATE_LIMIT_MAX_WAIT must be integers: {e}"
+        ) from None
+    if not 1 <= max_steps <= 50:
+        raise ValueError(f"GURNEY_MAX_STEPS must be between 1 and 50, got {max_steps}")
+    if api_timeout <= 0:
+        raise ValueError(f"GURNEY_API_TIMEOUT must be positive, got {api_timeout}")
+    if rate_limit_rpm <= 0:
+        raise ValueError(f"GURNEY_RATE_LIMIT_RPM must be positive, got {rate_limit_rpm}")
+    if rate_limit_max_wait <= 0:
+        raise ValueError(f"GURNEY_RATE_LIMIT_MAX_WAIT must be positive, got {rate_limit_max_wait}")
 
+    return GurneyConfig(
+        api_url=os.environ.get("GURNEY_API_URL", "http://localhost:8080").rstrip("/"),
+        default_url=os.environ.get("GURNEY_DEFAULT_URL", "https://learnpf.ai"),
+        max_steps=max_steps,
+        api_timeout=api_timeout,
+        rate_limit_rpm=rate_limit_rpm,
+        rate_limit_max_wait=rate_limit_max_wait,
+    )
+
+
+CONFIG = _load_gurney_config()
+
+# ── Debugging ─────────────────────────────────────────────────────────────────
+# Log every incoming Slack event (set to 1 to enable)
+GURNEY_DEBUG_EVENTS = os.environ.get("GURNEY_DEBUG_EVENTS", "") not in ("", "0")
@@ -8,23 +8,97 @@ Handles:
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
-import traceback
+import string
+import time
+from dataclasses import dataclass, field
 
 from slack_bolt.async_app import AsyncApp
 
 from slack.client import run_agent
+from slack.config import CONFIG
 
 logger = logging.getLogger(__name__)
 
 
+_MENTION_RE = re.compile(r"<@[A-Z0-9]+>\s*")
+_MENTION_ID_CHARS = frozenset(string.ascii_uppercase + string.digits)  # same charset as _MENTION_RE
+
+
+# Strong refs to in-flight prompt tasks so they aren't garbage-collected mid-run
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro):
+    """Run a coroutine in the background so the listener returns immediately."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 def _extract_prompt(text: str) -> str:
     """Strip bot mention markup (<@UXXXX>) and return the remaining text."""
-    return re.sub(r"<@[A-Z0-9]+>\s*", "", text).strip()
+    # Fast path: a single leading mention, which is almost every app_mention
+    if text.startswith("<@"):
+        end = text.find(">", 2, 24)
+        if end > 2 and _MENTION_ID_CHARS.issuperset(text[2:end]) and "<@" not in text[end:]:
+            return text[end + 1:].strip()
+    return _MENTION_RE.sub("", text).strip()
+
+
+# ── Rate limiting ─────────────────────────────────────────────────────────────
+
+@dataclass
+class _Bucket:
+    """Token bucket: holds up to `capacity` requests, refilled at `rate` per second."""
+    capacity: float
+    rate: float
+    request_tokens: float = field(init=False)
+    last_update: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.request_tokens = self.capacity
+
+    def acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        now = time.monotonic()
+        self.request_tokens = min(
+            self.capacity, self.request_tokens + (now - self.last_update) * self.rate
+        )
+        self.last_update = now
+        if self.request_tokens >= 1:
+            self.request_tokens -= 1
+            return 0.0
+        return (1 - self.request_tokens) / self.rate
+
+
+_buckets: dict[str, _Bucket] = {}
 
 
-async def _process_prompt(prompt: str, say, thread_ts: str | None = None):
+async def _wait_for_rate_limit(user_id: str | None) -> float:
+    """
+    Queue the caller until their bucket has a token. Returns 0 once acquired,
+    or the remaining wait if it exceeds CONFIG.rate_limit_max_wait.
+    """
+    if not user_id:
+        return 0.0
+    bucket = _buckets.get(user_id)
+    if bucket is None:
+        bucket = _buckets[user_id] = _Bucket(
+            capacity=CONFIG.rate_limit_rpm, rate=CONFIG.rate_limit_rpm / 60
+        )
+    while (wait := bucket.acquire()) > 0:
+        if wait > CONFIG.rate_limit_max_wait:
+            return wait
+        await asyncio.sleep(wait)
+    return 0.0
+
+
+async def _process_prompt(
+    prompt: str, say, thread_ts: str | None = None, user_id: str | None = None
+):
     """
     Shared logic: call the Gurney API and post the result back to Slack.
     All replies are posted in the same thread as the original message.
@@ -36,21 +110,36 @@ async def _process_prompt(prompt: str, say, thread_ts: str | None = None):
         )
         return
 
-    # Let the user know the agent is working
-    await say(f"I'm working on it...\n> _{prompt}_", thread_ts=thread_ts)
+    wait = await _wait_for_rate_limit(user_id)
+    if wait:
+        logger.info("[ 🔥 _process_prompt ] Rate limited user=%s for %.0fs", user_id, wait)
+        await say(
+            f":hourglass: You're sending requests too quickly — try again in {wait:.0f}s.",
+            thread_ts=thread_ts,
+        )
+        return
 
     try:
-        result = await run_agent(prompt)
+        # Let the user know the agent is working, without holding up the call
+        notice, result = await asyncio.gather(
+            say(f"I'm working on it...\n> _{prompt}_", thread_ts=thread_ts),
+            run_agent(prompt),
+            return_exceptions=True,
+        )
+        if isinstance(notice, BaseException):
+            logger.warning("[ 🔥 _process_prompt ] Could not post working notice: %s", notice)
+        if isinstance(result, BaseException):
+            raise result
 
-        if result.get("success"):
-            answer = result.get("result", "(no result)")
+        if result.success:
+            answer = result.result if result.result is not None else "(no result)"
             await say(f":white_check_mark: *Gurney result:*\n\n{answer}", thread_ts=thread_ts)
         else:
-            error = result.get("error", "Unknown error")
+            error = result.error if result.error is not None else "Unknown error"
             await say(f":x: Agent failed: {error}", thread_ts=thread_ts)
 
     except Exception as e:
-        logger.error(f"[ 🔥 _process_prompt ] {traceback.format_exc()}")
+        logger.exception("[ 🔥 _process_prompt ] Gurney API call failed: %r", e)
         await say(f":x: Something went wrong calling the Gurney API:\n```{e}```", thread_ts=thread_ts)
 
 
@@ -63,50 +152,55 @@ def register_handlers(app: AsyncApp):
     @app.command("/gurney")
     async def handle_gurney_command(ack, body, say):
         """Handle /gurney <prompt>."""
-        logger.info(f"[ 🎯 handle_gurney_command ] Received command: {body}")
+        # Ack before anything else — Slack retries if it takes over 3s
         await ack()
+        logger.info("[ 🎯 handle_gurney_command ] Received command: %s", body)
         prompt = (body.get("text") or "").strip()
-        logger.info(f"[ 🎯 handle_gurney_command ] prompt={prompt!r}")
+        logger.info("[ 🎯 handle_gurney_command ] prompt=%r", prompt)
         # Slash commands don't have a thread_ts, so replies go to channel
-        await _process_prompt(prompt, say)
+        _spawn(_process_prompt(prompt, say, user_id=body.get("user_id")))
 
     # ── App mention: @gurney <prompt> ─────────────────────────────────────────
     @app.event("app_mention")
     async def handle_app_mention(event, say):
         """Handle @gurney mentions in channels."""
-        logger.info(f"[ 💬 handle_app_mention ] Received event: {event}")
+        logger.info("[ 💬 handle_app_mention ] Received event: %s", event)
         raw_text = event.get("text", "")
         prompt = _extract_prompt(raw_text)
         thread_ts = event.get("thread_ts") or event.get("ts")
-        logger.info(f"[ 💬 handle_app_mention ] prompt={prompt!r}")
-        await _process_prompt(prompt, say, thread_ts=thread_ts)
+        logger.info("[ 💬 handle_app_mention ] prompt=%r", prompt)
+        _spawn(_process_prompt(prompt, say, thread_ts=thread_ts, user_id=event.get("user")))
 
     # ── Direct messages ───────────────────────────────────────────────────────
     @app.event("message")
     async def handle_dm(event, say):
         """Handle direct messages sent to the bot."""
-        logger.info(f"[ 📩 handle_dm ] Received message event: {event}")
+        logger.info("[ 📩 handle_dm ] Received message event: %s", event)
         # Only respond in DMs (channel type 'im')
         if event.get("channel_type") != "im":
-            logger.info(f"[ 📩 handle_dm ] Not a DM, channel_type={event.get('channel_type')}")
+            logger.info("[ 📩 handle_dm ] Not a DM, channel_type=%s", event.get("channel_type"))
             return
         # Ignore bot's own messages and message_changed subtypes
         if event.get("bot_id") or event.get("subtype"):
-            logger.info(f"[ 📩 handle_dm ] Ignoring bot message or subtype")
+            logger.info("[ 📩 handle_dm ] Ignoring bot message or subtype")
+            return
+
+        text = event.get("text")
+        if not text:
             return
 
-        prompt = (event.get("text") or "").strip()
+        prompt = text.strip()
         thread_ts = event.get("thread_ts") or event.get("ts")
-        logger.info(f"[ 📩 handle_dm ] prompt={prompt!r}")
-        await _process_prompt(prompt, say, thread_ts=thread_ts)
+        logger.info("[ 📩 handle_dm ] prompt=%r", prompt)
+        _spawn(_process_prompt(prompt, say, thread_ts=thread_ts, user_id=event.get("user")))
     
     # ── Debug: Catch-all event handler to see ALL events ────────────────────────
     @app.event({"type": re.compile(".*")})
     async def catch_all_events(event, logger):
         """Catch-all handler to log any events we're not explicitly handling."""
         event_type = event.get("type", "unknown")
-        logger.info(f"[ 🔍 catch_all_events ] Unhandled event type: {event_type}")
-        logger.info(f"[ 🔍 catch_all_events ] Event data: {event}")
+        logger.info("[ 🔍 catch_all_events ] Unhandled event type: %s", event_type)
+        logger.info("[ 🔍 catch_all_events ] Event data: %s", event)
     
     logger.info("[ 🔧 register_handlers ] Handlers registered successfully")
 